@@ -1,64 +1,51 @@
-from csv import DictReader
+from concurrent.futures import ThreadPoolExecutor
+from csv import reader as csv_reader
 from dataclasses import dataclass
-from os import makedirs, scandir, sep, DirEntry
-from os.path import dirname, exists, join as path_join, relpath
-from re import match, compile as re_compile, escape as re_escape
+from os import makedirs, scandir, sep, stat, DirEntry
+from os.path import dirname, exists, join as path_join
+from re import compile as re_compile
 from sys import exit, stderr
-from typing import Dict, List, OrderedDict, Union
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Union
 
 from dotenv import dotenv_values
 
 version = '1.0.2'
 
 
-@dataclass
 class Config:
     def __init__(self, config: Dict):
-        self.cash_book_path = ''
-        self.notimon_log_path = ''
-
-        if 'CASH_BOOK_PATH' in config:
-            self.cash_book_path = config['CASH_BOOK_PATH'].rstrip(sep)
-        if not self.cash_book_path or not exists(self.cash_book_path):
+        self.cash_book_path = (config.get('CASH_BOOK_PATH') or '').rstrip(sep)
+        try:
+            stat(self.cash_book_path)
+        except OSError:
             raise FileNotFoundError('CASH_BOOK_PATH is invalid')
 
-        if 'NOTIMON_LOG_PATH' in config:
-            self.notimon_log_path = config['NOTIMON_LOG_PATH'].rstrip(sep)
-        if not self.notimon_log_path or not exists(self.notimon_log_path):
+        self.notimon_log_path = (config.get('NOTIMON_LOG_PATH') or '').rstrip(sep)
+        try:
+            stat(self.notimon_log_path)
+        except OSError:
             raise FileNotFoundError('NOTIMON_LOG_PATH is invalid')
 
 
-@dataclass
+@dataclass(slots=True)
 class LogRecord:
-    def __init__(self, **kwargs):
-        self.timestamp: str = kwargs.get('Timestamp', '')
-        self.package: str = kwargs.get('Package', '')
-        self.title: str = kwargs.get('Title', '')
-        self.text: str = kwargs.get('Text', '')
+    timestamp: str = ''
+    package: str = ''
+    title: str = ''
+    text: str = ''
 
 
-@dataclass
+@dataclass(slots=True)
 class CashBookEntry:
-    path: str
-    timestamp: str
-    package: str
-    title: str  # LogRecord.title 과 다름
-    category: str
-    description: str
-    amount: int
-    account: str
-    balance: int
-
-    def __init__(self):
-        self.path = ''
-        self.timestamp = ''
-        self.package = ''
-        self.title = ''
-        self.category = ''
-        self.description = ''
-        self.amount = 0
-        self.account = ''
-        self.balance = 0
+    path: str = ''
+    timestamp: str = ''
+    package: str = ''
+    title: str = ''  # LogRecord.title 과 다름
+    category: str = ''
+    description: str = ''
+    amount: int = 0
+    account: str = ''
+    balance: int = 0
 
 
 class Marker:
@@ -89,9 +76,7 @@ class Marker:
         month = int(m.group(2))
         day = int(m.group(3))
 
-        if year > self._year or \
-                (year == self._year and month > self._month) or \
-                (year == self._year and month == self._month and day > self._day):
+        if (year, month, day) > (self._year, self._month, self._day):
             self._year = year
             self._month = month
             self._day = day
@@ -114,82 +99,80 @@ class Marker:
 
 class NotimonLogScan:
     def __init__(self, notimon_log_path: str, marker: Marker):
-        s = re_escape(sep)
-        self._dir_expr = re_compile(r'^\d{4}(?:' + s + r'\d{2})?$')
-        self._file_expr = re_compile(r'^\d{4}' + s + r'\d{2}' + s + r'\d{4}-\d{2}-\d{2}\.csv$')
-
         self._notimon_log_path = notimon_log_path
-        self._path_len = len(self._notimon_log_path)
         self._marker = marker
 
         self._files: List[DirEntry] = []
 
     def scan(self) -> List[DirEntry]:
-        self._files = []
-        self._deep_scan(self._notimon_log_path, 1)
+        # 트리 모양은 yyyy/mm/yyyy-mm-dd.csv 로 고정이므로 2단 루프로 순회
+        cut = (self._marker.year, self._marker.month, self._marker.day)
+        y_cut = cut[0]
+        ym_cut = cut[:2]
+
+        files: List[Tuple[Tuple[int, int, int], DirEntry]] = []
+
+        with scandir(self._notimon_log_path) as y_iter:
+            for y_entry in y_iter:
+                name = y_entry.name
+                if len(name) != 4 or not name.isdigit() or not y_entry.is_dir(follow_symlinks=False):
+                    continue
+                year = int(name)
+                if year < y_cut:
+                    continue
+
+                with scandir(y_entry.path) as m_iter:
+                    for m_entry in m_iter:
+                        name = m_entry.name
+                        if len(name) != 2 or not name.isdigit() or not m_entry.is_dir(follow_symlinks=False):
+                            continue
+                        if (year, int(name)) < ym_cut:
+                            continue
+
+                        with scandir(m_entry.path) as f_iter:
+                            for f_entry in f_iter:
+                                # yyyy-mm-dd.csv: 길이 14 고정
+                                name = f_entry.name
+                                if len(name) != 14 or not name.endswith('.csv') or \
+                                        not f_entry.is_file(follow_symlinks=False):
+                                    continue
+
+                                p = name[:-4].split('-')
+                                if len(p) != 3 or not all(s.isdigit() for s in p):
+                                    continue
+
+                                ymd = tuple(map(int, p))
+                                if ymd >= cut:
+                                    files.append((ymd, f_entry))
+
+        # (year, month, day) 정수 튜플로 날짜순 정렬
+        files.sort()
+        self._files = [entry for _, entry in files]
 
         return self._files
 
-    def _deep_scan(self, path: str, depth: int):
-        with scandir(path) as iterator:
-            for entry in iterator:
-                if entry.is_dir() and self._is_year_month_dir(entry, depth):
-                    self._deep_scan(entry.path, depth + 1)
-                elif entry.is_file() and self._is_targeted_file(entry):
-                    self._files.append(entry)
-
-    def _is_year_month_dir(self, entry: DirEntry, depth: int) -> bool:
-        if depth > 2:
-            return False
-
-        p = relpath(entry.path, self._notimon_log_path)
-        if not match(self._dir_expr, p):
-            return False
-
-        dirs = list(map(int, p.split(sep)))
-        match len(dirs):
-            case 1:
-                return dirs[0] >= self._marker.year
-            case 2:
-                return dirs[0] > self._marker.year or \
-                    (dirs[0] == self._marker.year and dirs[1] >= self._marker.month)
-            case _:
-                return False
-
-    def _is_targeted_file(self, entry: DirEntry) -> bool:
-        p = relpath(entry.path, self._notimon_log_path)
-        if not match(self._file_expr, p):
-            return False
-
-        parts = list(map(int, entry.name.split('.')[0].split('-')))
-
-        return parts[0] > self._marker.year or \
-            (parts[0] == self._marker.year and parts[1] > self._marker.month) or \
-            (parts[0] == self._marker.year and parts[1] == self._marker.month and parts[2] >= self._marker.day)
-
 
 class NotimonLogRead:
+    max_workers = 8
+
     def __init__(self, notimon_log_path: str, marker: Marker):
         self._notimon_log_path = notimon_log_path
         self._marker = marker
-        self._found: OrderedDict[str, List[Dict[str, str]]] = OrderedDict()
-
-    def read(self, entries: List[DirEntry]) -> OrderedDict[str, List[Dict[str, str]]]:
-        self._found = OrderedDict()
-
-        for entry in entries:
-            if not exists(entry.path):
-                raise Exception(f'File not found: {entry.path}')
 
-            # CSV file yyyy-mm-dd.csv
-            name = entry.name.split('.')[0]
+    def read(self, entries: List[DirEntry]) -> Iterator[Tuple[str, List[List[str]]]]:
+        # 작은 CSV 파일이 많아 open/read 지연이 지배적이므로 스레드 풀로 겹쳐 읽음.
+        # executor.map 은 제출 순서대로 결과를 돌려주므로 날짜순은 유지됨.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for entry, rows in zip(entries, executor.map(self._single_read, entries)):
+                # CSV file yyyy-mm-dd.csv
+                yield entry.name.split('.')[0], rows
 
-            with open(entry.path, mode='r', newline='', encoding='UTF8') as f:
-                reader = DictReader(f, ['Timestamp', 'Package', 'Title', 'Text'])
-                next(reader)  # Discard the header
-                self._found[name] = [row for row in reader]
-
-        return self._found
+    @staticmethod
+    def _single_read(entry: DirEntry) -> List[List[str]]:
+        with open(entry.path, mode='r', newline='', encoding='UTF8') as f:
+            reader = csv_reader(f)
+            next(reader, None)  # Discard the header
+            return list(reader)
 
 
 class Parser:
@@ -204,75 +187,49 @@ class WooriParser(Parser):
     """
     우리 WON 뱅킹 입출금 알림 텍스트
     """
-    date_expr = re_compile(r'^\d{2}/\d{2}$')
-    time_expr = re_compile(r'^\d{2}:\d{2}:\d{2}$')
-    value_expr = re_compile(r'^[\d,]+원$')
-    account_expr = re_compile(r'^[\d\-]+\*{3}계좌$')
+    # 1: 입금/출금, 2: 출처, 3: 금액, 4: 계좌, 5: 잔액, 6: 날짜, 7: 시간
+    text_expr = re_compile(
+        r'^\[(입금|출금)\] (.+?) ([\d,]+)원 ([\d\-]+\*{3})계좌 잔액 ([\d,]+)원 (\d{2}/\d{2}) (\d{2}:\d{2}:\d{2})$'
+    )
+
+    def __init__(self, cash_book_path: str):
+        super().__init__(cash_book_path)
+        self._path_prefix = cash_book_path + sep
 
     def parse(self, record: LogRecord) -> Union[CashBookEntry, None]:
         """
         텍스트 예시:
           [출금] 지에스２５　도곡 2,400원 1002-123-456***계좌 잔액 8,525원 02/26 01:13:38
-
-        공백으로 나누면 최소 8개의 길이를 가진 리스트가 됨
         """
         if 'com.wooribank.smart.npib' != record.package or '우리WON뱅킹 입출금알림' != record.title:
             return None
 
-        parts = record.text.split(' ')
+        text = record.text
 
-        if len(parts) < 8 and not ('[입금]' == parts[0] or '[출금]' == parts[1]):
+        # 정규식 전에 고정 접두어부터 확인
+        if not (text.startswith('[입금] ') or text.startswith('[출금] ')):
             return None
 
-        factor: int = 1 if '[입금]' == parts[0] else -1
-
-        parts.reverse()
-        # 0: 시간
-        # 1: 날짜
-        # 2: 잔액
-        # 3: '잔액' 고정 텍스트
-        # 4: 계좌
-        # 5: 금액
-        # 6~: 출처
-        # -1: [입금], [출금] 고정 텍스트
-
-        # 마지막 테스트 체크
-        # 시간 포맷
-        if not self.time_expr.match(parts[0]):
-            return None
-        # 날짜 포맷
-        if not self.date_expr.match(parts[1]):
-            return None
-        # 잔액 포맷
-        if not self.value_expr.match(parts[2]):
-            return None
-        # '잔액' 고정 텍스트
-        if '잔액' != parts[3]:
-            return None
-        # 계좌 포맷
-        if not self.account_expr.match(parts[4]):
-            return None
-        # 금액 포맷
-        if not self.value_expr.match(parts[5]):
+        m = self.text_expr.match(text)
+        if not m:
             return None
 
+        factor: int = 1 if '입금' == m.group(1) else -1
+
         entry = CashBookEntry()
 
-        # yyyy-mm-dd HH:ii:ss ---> yyyy-mm-dd HH-ii-ss
-        entry.path = path_join(
-            self.cash_book_path,
-            record.timestamp[0:7].replace('-', sep),
-            record.timestamp.replace(':', '-') + '.md'
-        )
+        ts = record.timestamp
+
+        # yyyy-mm-dd HH:ii:ss ---> yyyy/mm/yyyy-mm-dd HH-ii-ss.md
+        entry.path = f'{self._path_prefix}{ts[0:4]}{sep}{ts[5:7]}{sep}{ts.replace(":", "-")}.md'
 
         # 문자메시지에서 기록된 날짜를 기준으로
-        entry.timestamp = '{}-{}T{}'.format(record.timestamp[0:4], parts[1].replace('/', '-'), parts[0])
+        entry.timestamp = '{}-{}T{}'.format(ts[0:4], m.group(6).replace('/', '-'), m.group(7))
         entry.package = record.package
-        entry.title = ' '.join(parts[-2:5:-1])
-        entry.description = ''
-        entry.amount = int(parts[5][0:-1].replace(',', '')) * factor
-        entry.account = parts[4][0:-2]  # '계좌' 텍스트 제거
-        entry.balance = int(parts[2][0:-1].replace(',', ''))
+        entry.title = m.group(2)
+        entry.amount = int(m.group(3).replace(',', '')) * factor
+        entry.account = m.group(4)
+        entry.balance = int(m.group(5).replace(',', ''))
 
         return entry
 
@@ -281,35 +238,54 @@ class Importer:
     def __init__(self, cash_book_path: str):
         self.cash_book_path = cash_book_path
 
-    def import_to_cashbook(self, records: List[Dict[str, str]]) -> Union[CashBookEntry, None]:
+        # 패키지 이름을 키로 파서를 한 번만 생성
+        self._parsers: Dict[str, Parser] = {
+            'com.wooribank.smart.npib': WooriParser(cash_book_path),
+        }
+
+        # 이미 만들어진 것이 확인된 디렉토리
+        self._dirs_made: Set[str] = set()
+
+    def import_to_cashbook(self, records: Iterable[List[str]]) -> Union[CashBookEntry, None]:
+        # 행마다 새로 만들지 않고 하나의 LogRecord 를 덮어쓰며 재사용
+        r = LogRecord()
+
         for record in records:
-            r = LogRecord(**record)
+            if len(record) != 4:
+                continue
 
-            match r.package:
-                case 'com.wooribank.smart.npib':
-                    entry = WooriParser(self.cash_book_path).parse(r)
-                case _:
-                    entry = None
+            # CSV 컬럼 순서: Timestamp, Package, Title, Text
+            r.timestamp, r.package, r.title, r.text = record
 
-            if entry and not exists(entry.path):
+            parser = self._parsers.get(r.package)
+            entry = parser.parse(r) if parser else None
+
+            if entry:
                 self._create_markdown(entry)
 
-    @staticmethod
-    def _create_markdown(entry: CashBookEntry):
-        if not exists(dirname(entry.path)):
-            makedirs(dirname(entry.path), mode=0o755)
-
-        with open(entry.path, mode='w', encoding='utf-8') as f:
-            f.write('---\n')  # start the properties
-            f.write(f'일시: {entry.timestamp}\n')
-            f.write(f'패키지: {entry.package}\n')
-            f.write(f'항목: {entry.title}\n')
-            f.write(f'입출금분류: {entry.category}\n')
-            f.write(f'설명: {entry.description}\n')
-            f.write(f'금액: {entry.amount}\n')
-            f.write(f'계좌: {entry.account}\n')
-            f.write(f'잔액(알림): {entry.balance}\n')
-            f.write('---\n')  # finish
+    def _create_markdown(self, entry: CashBookEntry):
+        d = dirname(entry.path)
+        if d not in self._dirs_made:
+            makedirs(d, mode=0o755, exist_ok=True)
+            self._dirs_made.add(d)
+
+        try:
+            # 'x': 이미 기록된 항목은 배타적 생성 실패로 걸러짐
+            with open(entry.path, mode='x', encoding='utf-8') as f:
+                f.write(
+                    '---\n'  # start the properties
+                    f'일시: {entry.timestamp}\n'
+                    f'패키지: {entry.package}\n'
+                    f'항목: {entry.title}\n'
+                    f'입출금분류: {entry.category}\n'
+                    f'설명: {entry.description}\n'
+                    f'금액: {entry.amount}\n'
+                    f'계좌: {entry.account}\n'
+                    f'잔액(알림): {entry.balance}\n'
+                    '---\n'  # finish
+                )
+        except FileExistsError:
+            pass
 
 
 def import_to_cashbook():
@@ -324,22 +300,21 @@ def import_to_cashbook():
         marker=marker
     ).scan()
 
-    files.sort(key=lambda entry: entry.path)
-
-    # Read CSV records
-    daily_records = NotimonLogRead(
+    # Read CSV records, one file at a time
+    reader = NotimonLogRead(
         notimon_log_path=config.notimon_log_path,
         marker=marker
-    ).read(files)
+    )
 
     importer = Importer(cash_book_path=config.cash_book_path)
 
-    for date, records in daily_records.items():
+    last_date = ''
+    for date, records in reader.read(files):
         importer.import_to_cashbook(records)
+        last_date = date
 
-    dates = list(daily_records.keys())
-    if dates:
-        marker.set_new_marker(dates[-1])
+    if last_date:
+        marker.set_new_marker(last_date)
 
 
 if '__main__' == __name__: